@@ -1,5 +1,5 @@
 import itertools
-from collections import defaultdict
+import numpy as np
 from nanome.api.shapes import Label, Shape
 from nanome.api.structure import Molecule
 from nanome.api.interactions import Interaction
@@ -12,33 +12,50 @@ class StructurePairManager:
 
     def __init__(self):
         super().__init__()
-        self._data = defaultdict(list)
+        self._data = {}
 
     @staticmethod
-    def get_structpair_key(struct1_key, struct2_key):
-        """Return a string key for the given atom indices."""
-        structpair_key = '|'.join(sorted([str(struct1_key), str(struct2_key)]))
-        return structpair_key
+    def get_struct_key(struct_index):
+        """Return a sorted tuple of atom indices, given an atom index, struct index str, or tuple of atom indices."""
+        if isinstance(struct_index, int):
+            return (struct_index,)
+        if isinstance(struct_index, tuple):
+            return tuple(sorted(struct_index))
+        return tuple(sorted(int(x) for x in str(struct_index).split(',')))
+
+    @classmethod
+    def get_structpair_key(cls, struct1_key, struct2_key):
+        """Return a (struct1, struct2) tuple key for the given struct indices, in canonical order."""
+        struct1_key = cls.get_struct_key(struct1_key)
+        struct2_key = cls.get_struct_key(struct2_key)
+        if struct1_key <= struct2_key:
+            return (struct1_key, struct2_key)
+        return (struct2_key, struct1_key)
 
     @staticmethod
     def get_structpair_key_for_line(line):
-        """Return a string key for the given atom indices."""
-        sorted_atom1_idx_arr = sorted(line.atom1_idx_arr)
-        sorted_atom2_idx_arr = sorted(line.atom2_idx_arr)
-        struct1_key = ','.join([str(x) for x in sorted_atom1_idx_arr])
-        struct2_key = ','.join([str(x) for x in sorted_atom2_idx_arr])
-        structpair_key = '|'.join(sorted([struct1_key, struct2_key]))
+        """Return a (struct1, struct2) tuple key for the atom indices of the line.
+
+        The key is cached on the line, as its atom indices don't change after creation.
+        """
+        structpair_key = getattr(line, '_structpair_key', None)
+        if structpair_key is not None:
+            return structpair_key
+        struct1_key = tuple(sorted(line.atom1_idx_arr))
+        struct2_key = tuple(sorted(line.atom2_idx_arr))
+        if struct1_key <= struct2_key:
+            structpair_key = (struct1_key, struct2_key)
+        else:
+            structpair_key = (struct2_key, struct1_key)
+        line._structpair_key = structpair_key
         return structpair_key
 
 
 class LabelManager(StructurePairManager):
 
     def all_labels(self):
-        """Return a flat list of all lines being stored."""
-        all_lines = []
-        for structpair_key, label in sorted(self._data.items(), key=lambda keyval: keyval[0]):
-            all_lines.append(self._data[structpair_key])
-        return all_lines
+        """Return a flat list of all labels being stored."""
+        return list(self._data.values())
 
     def add_label(self, label, struct1_index, struct2_index):
         if not isinstance(label, Label):
@@ -70,6 +87,11 @@ class LabelManager(StructurePairManager):
 class InteractionLineManager:
     """Organizes Interaction lines by atom pairs."""
 
+    def __init__(self):
+        super().__init__()
+        # Visibility settings and molecules applied by the last update_interaction_lines call.
+        self._last_visibility_key = None
+
     async def all_lines(self, **get_kwargs):
         """Return a flat list of all lines being stored."""
         all_lines = await Interaction.get(**get_kwargs)
@@ -88,16 +110,18 @@ class InteractionLineManager:
         :arg struct2: InteractionStructure, or index str
         """
         struct_lines = []
-        struct1_atom_indices = [int(x) for x in struct1.index.split(',')]
-        struct2_atom_indices = [int(x) for x in struct2.index.split(',')]
+        struct1_atom_indices = frozenset(struct1.atom_indices)
+        struct2_atom_indices = frozenset(struct2.atom_indices)
         for line in existing_lines:
-            struct1_is_line_atom1 = all(i in line.atom1_idx_arr for i in struct1_atom_indices)
-            struct1_is_line_atom2 = all(i in line.atom2_idx_arr for i in struct1_atom_indices)
+            # Sets are cached on the line, because the same lines are checked against every structure pair.
+            line_atom1_indices, line_atom2_indices = utils.get_atom_idx_sets(line)
+            struct1_is_line_atom1 = struct1_atom_indices.issubset(line_atom1_indices)
+            struct1_is_line_atom2 = struct1_atom_indices.issubset(line_atom2_indices)
             if not struct1_is_line_atom1 and not struct1_is_line_atom2:
                 continue
 
-            struct2_is_line_atom1 = all(i in line.atom1_idx_arr for i in struct2_atom_indices)
-            struct2_is_line_atom2 = all(i in line.atom2_idx_arr for i in struct2_atom_indices)
+            struct2_is_line_atom1 = struct2_atom_indices.issubset(line_atom1_indices)
+            struct2_is_line_atom2 = struct2_atom_indices.issubset(line_atom2_indices)
             if not struct2_is_line_atom1 and not struct2_is_line_atom2:
                 continue
 
@@ -113,6 +137,7 @@ class InteractionLineManager:
 
     def upload(self, line_list):
         """Upload multiple lines to Nanome."""
+        self._last_visibility_key = None
         Interaction.upload_multiple(line_list)
 
     @staticmethod
@@ -123,12 +148,8 @@ class InteractionLineManager:
         :arg struct2: struct
         :arg line_settings: Dict describing shape and color of line based on interaction_type
         """
-        struct1_indices = []
-        struct2_indices = []
-        for struct1_index in struct1.index.split(','):
-            struct1_indices.append(int(struct1_index))
-        for struct2_index in struct2.index.split(','):
-            struct2_indices.append(int(struct2_index))
+        struct1_indices = list(struct1.atom_indices)
+        struct2_indices = list(struct2.atom_indices)
 
         interaction_kind = kind
         atom1_conformation = struct1.conformer
@@ -154,30 +175,42 @@ class InteractionLineManager:
                 if cmp.current_molecule is not None
             ]
             get_kwargs['molecules_idx'] = mol_indices
+        kind_visible = {kind: form_data['visible'] for kind, form_data in interactions_data.items()}
+        # Skip fetching lines if these settings were already applied, and no lines changed since.
+        visibility_key = (tuple(sorted(kind_visible.items())), tuple(get_kwargs.get('molecules_idx', ())))
+        if visibility_key == self._last_visibility_key:
+            Logs.debug('Interaction visibility unchanged, skipping update')
+            return
         interactions = await self.all_lines(**get_kwargs)
         lines_to_update = []
         for line in interactions:
-            interaction_type = line.kind.name
-            interaction_type_visible = interactions_data[interaction_type]['visible']
+            interaction_type_visible = kind_visible[line.kind.name]
             if line.visible != interaction_type_visible:
                 line.visible = interaction_type_visible
                 lines_to_update.append(line)
         Logs.debug(f'Updating {len(lines_to_update)} lines')
         self.upload(lines_to_update)
+        self._last_visibility_key = visibility_key
 
     def destroy_lines(self, lines_to_delete):
+        self._last_visibility_key = None
         Interaction.destroy_multiple(lines_to_delete)
 
 
 class ShapesLineManager(StructurePairManager):
     """Organizes Interaction lines by atom pairs."""
 
+    def __init__(self):
+        super().__init__()
+        # Maps line index to (structpair_key, position in line list), for quick lookup in _update_line.
+        self._line_locations = {}
+
     async def all_lines(self, **kwargs):
-        """Return a flat list of all lines being stored."""
-        all_lines = []
-        for _, line_list in sorted(self._data.items(), key=lambda keyval: keyval[0]):
-            all_lines.extend(line_list)
-        return all_lines
+        """Return a flat list of all lines being stored.
+
+        Order is stable while lines aren't added, which the color stream relies on.
+        """
+        return list(itertools.chain.from_iterable(self._data.values()))
 
     def add_lines(self, line_list):
         for line in line_list:
@@ -188,9 +221,11 @@ class ShapesLineManager(StructurePairManager):
             raise TypeError(f'add_line() expected InteractionLine, received {type(line)}')
 
         structpair_key = self.get_structpair_key_for_line(line)
-        existing_interaction_kinds = [ln.kind for ln in self._data[structpair_key]]
+        line_list = self._data.setdefault(structpair_key, [])
+        existing_interaction_kinds = [ln.kind for ln in line_list]
         if line.kind not in existing_interaction_kinds:
-            self._data[structpair_key].append(line)
+            line_list.append(line)
+            self._record_line_location(line, structpair_key, len(line_list) - 1)
             # Clear stream now that the line list is changing
             self._destroy_stream()
 
@@ -200,8 +235,8 @@ class ShapesLineManager(StructurePairManager):
         :arg struct1: InteractionStructure
         :arg struct2: InteractionStructure
         """
-        key = self.get_structpair_key(struct1.index, struct2.index)
-        return self._data[key]
+        key = self.get_structpair_key(struct1.atom_indices, struct2.atom_indices)
+        return self._data.get(key, ())
 
     def upload(self, line_list):
         """Upload multiple lines to Nanome."""
@@ -245,34 +280,29 @@ class ShapesLineManager(StructurePairManager):
             if not self._stream:
                 Logs.error("Failed to Create stream.")
                 return
-        new_colors = []
-        in_frame_count = 0
-        out_of_frame_count = 0
-
-        for line in all_lines:
-            # Make sure that both atoms connected by line are in frame.
-            atom_iter = itertools.chain.from_iterable(cmp.current_molecule.atoms for cmp in complexes if cmp.current_molecule)
-            line_is_in_frame = utils.line_in_frame(line, atom_iter)
-            if line_is_in_frame:
-                in_frame_count += 1
-            else:
-                out_of_frame_count += 1
-
-            # Parse forms, and add line data to stream
-            line_type = line.kind.name
-            form_data = interactions_data[line_type]
-            hide_interaction = not form_data['visible'] or not line_is_in_frame
-            color = Color(*form_data['color'])
-
-            color.a = 0 if hide_interaction else 255
-            new_colors.extend(color.rgba)
-            line.color = color
+        # Per interaction kind, an rgba palette row and a (shown, hidden) pair of Colors shared by all its lines.
+        kind_ids = {kind: i for i, kind in enumerate(interactions_data)}
+        palette = np.array(
+            [[*tuple(form_data['color'])[:3], 255] for form_data in interactions_data.values()], dtype=np.uint8)
+        kind_visible = np.array([bool(form_data['visible']) for form_data in interactions_data.values()], dtype=bool)
+        kind_colors = [(Color(r, g, b, 255), Color(r, g, b, 0)) for r, g, b, _ in palette.tolist()]
+
+        # Check whether both structures connected by each line are in frame, for all lines at once.
+        in_frame_mask = utils.lines_in_frame_mask(all_lines, complexes)
+
+        line_kind_ids = np.fromiter(
+            (kind_ids[line.kind.name] for line in all_lines), dtype=np.int32, count=len(all_lines))
+        hidden_mask = ~(kind_visible[line_kind_ids] & in_frame_mask)
+        # Stream payload, one rgba row per line.
+        new_colors = palette[line_kind_ids]
+        new_colors[hidden_mask, 3] = 0
+
+        for line, kind_id, hide_interaction in zip(all_lines, line_kind_ids.tolist(), hidden_mask.tolist()):
+            line.color = kind_colors[kind_id][1 if hide_interaction else 0]
             self._update_line(line)
 
-        # Logs.debug(f'in frame: {in_frame_count}')
-        # Logs.debug(f'out of frame: {out_of_frame_count}')
         if self._stream:
-            self._stream.update(new_colors)
+            self._stream.update(new_colors.ravel())
 
     def destroy_lines(self, lines_to_delete):
         Shape.destroy_multiple(lines_to_delete)
@@ -280,6 +310,7 @@ class ShapesLineManager(StructurePairManager):
             structpair_key = self.get_structpair_key_for_line(line)
             if structpair_key in self._data:
                 self._data[structpair_key].remove(line)
+                self._line_locations.pop(line.index, None)
             else:
                 Logs.warning("Line not found in manager while deleting.")
 
@@ -294,9 +325,25 @@ class ShapesLineManager(StructurePairManager):
 
     def _update_line(self, line):
         """Replace line stored in manager with updated version passed as arg."""
+        location = self._line_locations.get(line.index)
+        if location:
+            structpair_key, i = location
+            line_list = self._data.get(structpair_key, ())
+            # Positions shift when lines are destroyed, so confirm before replacing.
+            if i < len(line_list) and line_list[i].index == line.index:
+                line_list[i] = line
+                return
         structpair_key = self.get_structpair_key(*line.structure_indices)
+        if structpair_key not in self._data:
+            return
         line_list = self._data[structpair_key]
         for i, stored_line in enumerate(line_list):
             if stored_line.index == line.index:
                 line_list[i] = line
+                self._record_line_location(line, structpair_key, i)
                 break
+
+    def _record_line_location(self, line, structpair_key, position):
+        # Lines don't have an index until upload completes, so they can't be tracked yet.
+        if line.index != -1:
+            self._line_locations[line.index] = (structpair_key, position)
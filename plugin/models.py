@@ -2,7 +2,7 @@ from operator import attrgetter
 
 from nanome.api.shapes import Line
 from nanome.api.structure import Atom
-from nanome.util import Vector3, Logs
+from nanome.util import Color, Vector3, Logs
 
 
 class InteractionStructure:
@@ -37,6 +37,13 @@ class InteractionStructure:
             self._atoms = []
         return self._atoms
 
+    @property
+    def atom_indices(self):
+        """Sorted tuple of the indices of atoms in structure. Same values as index, without parsing the str."""
+        if not hasattr(self, '_atom_indices'):
+            self._atom_indices = tuple(sorted(a.index for a in self.atoms))
+        return self._atom_indices
+
     @property
     def line_anchor(self):
         """Arbitrary atom in structure, but consistent."""
@@ -89,7 +96,7 @@ class InteractionShapesLine(Line):
                 setattr(self, kwarg, value)
 
         if kwargs.get('visible') is False:
-            self.color.a = 0
+            self.visible = False
 
         # Set up frames, conformers, and positions dict.
         for struct in [struct1, struct2]:
@@ -100,6 +107,9 @@ class InteractionShapesLine(Line):
         # Save atom_indices to be interchangeable with Interaction objects
         self.atom1_idx_arr = [atm.index for atm in struct1.atoms]
         self.atom2_idx_arr = [atm.index for atm in struct2.atoms]
+        # Sets for fast membership checks. See utils.get_atom_idx_sets
+        self.atom1_idx_set = frozenset(self.atom1_idx_arr)
+        self.atom2_idx_set = frozenset(self.atom2_idx_arr)
 
     @property
     def kind(self):
@@ -155,10 +165,9 @@ class InteractionShapesLine(Line):
 
     @visible.setter
     def visible(self, value: bool):
-        if value:
-            self.color.a = 1
-        else:
-            self.color.a = 0
+        # Assign a new Color rather than changing alpha in place, since Colors can be shared between lines.
+        alpha = 1 if value else 0
+        self.color = Color(self.color.r, self.color.g, self.color.b, alpha)
 
     @property
     def atom1_conformation(self):
@@ -1,5 +1,6 @@
 import itertools
 import time
+import numpy as np
 from nanome.api import structure
 from nanome.api.interactions import Interaction
 from nanome.util import ComplexUtils, Vector3, Logs
@@ -22,7 +23,7 @@ def extract_residues_from_complex(comp, residue_list, comp_name=None):
     new_comp.position = comp.position
     new_comp.rotation = comp.rotation
 
-    binding_site_residue_indices = [r.index for r in residue_list]
+    binding_site_residue_indices = frozenset(r.index for r in residue_list)
     for ch in comp.chains:
         reses_on_chain = [res for res in ch.residues if res.index in binding_site_residue_indices]
         if reses_on_chain:
@@ -33,21 +34,34 @@ def extract_residues_from_complex(comp, residue_list, comp_name=None):
     return new_comp
 
 
+def get_current_molecule(comp):
+    """Return the Molecule for the complex's current frame, or None.
+
+    Indexes into the molecule list directly, instead of scanning it like Complex.current_molecule.
+    """
+    molecules = comp._molecules
+    frame = comp.current_frame
+    if 0 <= frame < len(molecules):
+        return molecules[frame]
+    return None
+
+
 def get_neighboring_atoms(target_reference: structure.Complex, selected_atoms: list, site_size=6):
     """Use KDTree to find target atoms within site_size radius of selected atoms."""
-    mol = getattr(target_reference, 'current_molecule', structure.Molecule())
-    ligand_positions = [atom.position.unpack() for atom in selected_atoms]
-    target_atoms = itertools.chain(*[ch.atoms for ch in mol.chains if not ch.name.startswith("H")])
-    target_tree = KDTree([atom.position.unpack() for atom in target_atoms])
-    target_point_indices = target_tree.query_ball_point(ligand_positions, site_size)
-    near_point_set = set()
-    for point_indices in target_point_indices:
-        for point_index in point_indices:
-            near_point_set.add(tuple(target_tree.data[point_index]))
-    neighbor_atoms = []
-    for targ_atom in mol.atoms:
-        if targ_atom.position.unpack() in near_point_set:
-            neighbor_atoms.append(targ_atom)
+    mol = get_current_molecule(target_reference) or structure.Molecule()
+    target_atoms = [atom for ch in mol.chains if not ch.name.startswith("H") for atom in ch.atoms]
+    if not target_atoms or not selected_atoms:
+        return []
+    ligand_positions = np.fromiter(
+        (coord for atom in selected_atoms for coord in atom.position.unpack()), dtype=np.float64).reshape(-1, 3)
+    target_positions = np.fromiter(
+        (coord for atom in target_atoms for coord in atom.position.unpack()), dtype=np.float64).reshape(-1, 3)
+    target_tree = KDTree(target_positions)
+    ligand_tree = KDTree(ligand_positions)
+    # For each target atom, the ligand atoms within site_size of it.
+    target_neighbors = target_tree.query_ball_tree(ligand_tree, site_size)
+    near_point_mask = np.fromiter((bool(n) for n in target_neighbors), dtype=bool, count=len(target_atoms))
+    neighbor_atoms = [target_atoms[i] for i in np.flatnonzero(near_point_mask)]
     return neighbor_atoms
 
 
@@ -70,19 +84,20 @@ def merge_complexes(complexes, align_reference, selected_atoms_only=False):
     new_mol = structure.Molecule()
     merged_complex.add_molecule(new_mol)
     for comp in comp_copies:
-        ComplexUtils.align_to(comp, align_reference)
-        current_mol_index = int(comp.current_molecule.index)
+        current_mol = get_current_molecule(comp)
         # Only return current molecule
-        comp._molecules = [mol for mol in comp._molecules if mol.index == current_mol_index]
+        comp._molecules = [current_mol]
         comp.set_current_frame(0)
-        current_mol = comp.current_molecule
+        # Align after dropping other frames, so only the current molecule's atoms are transformed.
+        ComplexUtils.align_to(comp, align_reference)
         # Extract only the current conformer from the molecule
         current_mol.move_conformer(current_mol.current_conformer, 0)
         current_mol.set_conformer_count(1)
 
         if selected_atoms_only and comp.index != align_reference.index:
             # Extract selected copy selected residues
-            selected_residues = [res for res in current_mol.residues if any(a.selected for a in res.atoms)]
+            # Single pass over atoms, collecting residues of selected atoms in order.
+            selected_residues = list(dict.fromkeys(a.residue for a in current_mol.atoms if a.selected))
             extracted_comp = extract_residues_from_complex(comp, selected_residues)
             for ch in extracted_comp.chains:
                 new_mol.add_chain(ch)
@@ -137,12 +152,13 @@ def centroid(atoms):
 def calculate_interaction_length(line: Interaction, complexes):
     """Determine length of line using the distance between the structures."""
     all_atoms = itertools.chain(*[comp.atoms for comp in complexes])
+    atom1_idx_set, atom2_idx_set = get_atom_idx_sets(line)
     struct1_atoms = []
     struct2_atoms = []
     for atom in all_atoms:
-        if atom.index in line.atom1_idx_arr:
+        if atom.index in atom1_idx_set:
             struct1_atoms.append(atom)
-        if atom.index in line.atom2_idx_arr:
+        if atom.index in atom2_idx_set:
             struct2_atoms.append(atom)
     struct1_centroid = centroid(struct1_atoms)
     struct2_centroid = centroid(struct2_atoms)
@@ -150,6 +166,19 @@ def calculate_interaction_length(line: Interaction, complexes):
     return distance
 
 
+def get_atom_idx_sets(line: Union[Interaction, InteractionShapesLine]):
+    """Return frozensets of the line's atom1 and atom2 indices.
+
+    InteractionShapesLines set these on creation, Interactions have them cached on first call.
+    """
+    atom1_idx_set = getattr(line, 'atom1_idx_set', None)
+    atom2_idx_set = getattr(line, 'atom2_idx_set', None)
+    if atom1_idx_set is None or atom2_idx_set is None:
+        atom1_idx_set = line.atom1_idx_set = frozenset(line.atom1_idx_arr)
+        atom2_idx_set = line.atom2_idx_set = frozenset(line.atom2_idx_arr)
+    return atom1_idx_set, atom2_idx_set
+
+
 def line_in_frame(line: Union[Interaction, InteractionShapesLine], atom_iter):
     """Return boolean stating whether both structures connected by line are in frame.
 
@@ -159,11 +188,12 @@ def line_in_frame(line: Union[Interaction, InteractionShapesLine], atom_iter):
     # Find the atoms from the comp by their id, and make sure  they're in the same conformer.
     atom1_in_frame = None
     atom2_in_frame = None
+    atom1_idx_set, atom2_idx_set = get_atom_idx_sets(line)
     for atom in atom_iter:
         atom_conformer = atom.molecule.current_conformer
-        if atom.index in line.atom1_idx_arr:
+        if atom.index in atom1_idx_set:
             atom1_in_frame = atom_conformer == line.atom1_conformation
-        elif atom.index in line.atom2_idx_arr:
+        elif atom.index in atom2_idx_set:
             atom2_in_frame = atom_conformer == line.atom2_conformation
         if atom1_in_frame is not None and atom2_in_frame is not None:
             break
@@ -171,13 +201,52 @@ def line_in_frame(line: Union[Interaction, InteractionShapesLine], atom_iter):
     return line_in_frame
 
 
+def lines_in_frame_mask(line_list: List[Union[Interaction, InteractionShapesLine]], complexes):
+    """Return boolean array stating whether each line in line_list is in frame. Vectorized line_in_frame.
+
+    All atoms in a structure belong to the same molecule, so the first atom of each structure is checked.
+    """
+    atom_indices = []
+    atom_conformers = []
+    for comp in complexes:
+        mol = get_current_molecule(comp)
+        if not mol:
+            continue
+        mol_atom_indices = [atom.index for atom in mol.atoms]
+        atom_indices.extend(mol_atom_indices)
+        atom_conformers.extend([mol.current_conformer] * len(mol_atom_indices))
+    line_count = len(line_list)
+    if not atom_indices or not line_count:
+        return np.zeros(line_count, dtype=bool)
+    atom_indices = np.asarray(atom_indices, dtype=np.int64)
+    atom_conformers = np.asarray(atom_conformers, dtype=np.int64)
+    sort_order = np.argsort(atom_indices)
+    atom_indices = atom_indices[sort_order]
+    atom_conformers = atom_conformers[sort_order]
+
+    in_frame_mask = np.ones(line_count, dtype=bool)
+    for idx_arr_attr, conformation_attr in [
+            ('atom1_idx_arr', 'atom1_conformation'), ('atom2_idx_arr', 'atom2_conformation')]:
+        struct_atoms = np.fromiter(
+            (getattr(line, idx_arr_attr)[0] for line in line_list), dtype=np.int64, count=line_count)
+        # Lines without a conformation can never match, so use -1 as a placeholder.
+        struct_conformers = np.fromiter(
+            (-1 if conf is None else conf for conf in (getattr(line, conformation_attr) for line in line_list)),
+            dtype=np.int64, count=line_count)
+        positions = np.searchsorted(atom_indices, struct_atoms).clip(max=len(atom_indices) - 1)
+        in_frame_mask &= atom_indices[positions] == struct_atoms
+        in_frame_mask &= atom_conformers[positions] == struct_conformers
+    return in_frame_mask
+
+
 def get_lines_in_frame(line_list: List[Union[Interaction, InteractionShapesLine]], complexes):
     output = []
     Logs.debug("Starting lines in frame.")
-    current_mols = [comp.current_molecule for comp in complexes if comp.current_molecule]
+    current_mols = [mol for mol in map(get_current_molecule, complexes) if mol]
     start_time = time.time()
     for line in line_list:
-        relevant_atom_indices = set(line.atom1_idx_arr + line.atom2_idx_arr)
+        atom1_idx_set, atom2_idx_set = get_atom_idx_sets(line)
+        relevant_atom_indices = atom1_idx_set | atom2_idx_set
         atom_chain = itertools.chain(*(mol.atoms for mol in current_mols))
         atoms_with_interactions = filter(lambda atm: atm.index in relevant_atom_indices, atom_chain)
         line_is_in_frame = line_in_frame(line, atoms_with_interactions)
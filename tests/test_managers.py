@@ -75,6 +75,52 @@ class ShapesLineManagerTestCase(unittest.IsolatedAsyncioTestCase):
         updated_line = line = next(line for line in all_lines if line.kind == new_kind)
         self.assertEqual(updated_line.kind, new_kind)
 
+    def test_get_structpair_key(self):
+        """Keys match regardless of how struct indices are passed."""
+        line_key = self.manager.get_structpair_key_for_line(self.interaction_line_2)
+        atom_indices = self.struct3.atom_indices
+        self.assertEqual(self.manager.get_structpair_key(self.struct1.index, self.struct3.index), line_key)
+        self.assertEqual(self.manager.get_structpair_key(atom_indices, self.struct1.atom_indices), line_key)
+        self.assertEqual(self.manager.get_structpair_key(atom_indices[::-1], self.struct1.atom_indices[0]), line_key)
+
+    @patch('nanome.api.shapes.shape.Shape.destroy_multiple')
+    def test_update_line_after_destroy(self, destroy_mock):
+        """Ensure _update_line replaces the right line once positions shift, and records new location."""
+        kinds = [enums.InteractionKind.Covalent, enums.InteractionKind.Clash, enums.InteractionKind.Ionic]
+        lines = []
+        for i, kind in enumerate(kinds):
+            line = InteractionShapesLine(self.struct1, self.struct2, kind=kind)
+            line._index = 100 + i
+            lines.append(line)
+        self.manager.add_lines(lines)
+        structpair_key = self.manager.get_structpair_key(self.struct1.atom_indices, self.struct2.atom_indices)
+        self.assertEqual(self.manager._line_locations[102], (structpair_key, 2))
+
+        # Destroying first line shifts positions, so stored location for last line is stale.
+        self.manager.destroy_lines([lines[0]])
+        self.assertNotIn(100, self.manager._line_locations)
+        updated_line = InteractionShapesLine(self.struct1, self.struct2, kind=kinds[2])
+        updated_line._index = 102
+        self.manager._update_line(updated_line)
+        self.assertEqual(self.manager._data[structpair_key], [lines[1], updated_line])
+        self.assertEqual(self.manager._line_locations[102], (structpair_key, 1))
+        # Stale location that is still in range points at a different line.
+        updated_line_2 = InteractionShapesLine(self.struct1, self.struct2, kind=kinds[1])
+        updated_line_2._index = 101
+        self.manager._update_line(updated_line_2)
+        self.assertEqual(self.manager._data[structpair_key], [updated_line_2, updated_line])
+        self.assertEqual(self.manager._line_locations[101], (structpair_key, 0))
+
+    def test_update_line_before_upload(self):
+        """Lines without an index aren't tracked until _update_line finds them after upload."""
+        self.manager.add_lines([self.interaction_line, self.interaction_line_2])
+        self.assertEqual(self.manager._line_locations, {})
+        # Simulate upload completing
+        self.interaction_line._index = 200
+        self.manager._update_line(self.interaction_line)
+        structpair_key = self.manager.get_structpair_key_for_line(self.interaction_line)
+        self.assertEqual(self.manager._line_locations[200], (structpair_key, 0))
+
     @patch('nanome.api.shapes.shape.Shape.upload_multiple')
     def test_upload(self, upload_mock):
         line_list = [self.interaction_line, self.interaction_line_2]
@@ -115,6 +161,51 @@ class ShapesLineManagerTestCase(unittest.IsolatedAsyncioTestCase):
         structpair_lines_2_3 = self.manager.get_lines_for_structure_pair(
             self.struct2, self.struct3)
         self.assertEqual(len(structpair_lines_2_3), 0)
+        # Looking up a pair without lines shouldn't add an entry for it.
+        self.assertEqual(len(self.manager._data), 2)
+
+    async def test_update_interaction_lines(self):
+        """Ensure stream receives an rgba quartet for every line, hiding invisible kinds."""
+        lines = [self.interaction_line, self.interaction_line_2]
+        self.manager.add_lines(lines)
+        stream = MagicMock()
+        plugin = MagicMock()
+        create_stream_fut = asyncio.Future()
+        create_stream_fut.set_result((stream, None))
+        plugin.create_writing_stream.return_value = create_stream_fut
+
+        interactions_data = {
+            kind: dict(settings) for kind, settings in default_line_settings.items()
+        }
+        interactions_data['Aromatic']['visible'] = False
+        await self.manager.update_interaction_lines(interactions_data, complexes=[self.complex], plugin=plugin)
+
+        stream.update.assert_called_once()
+        new_colors = list(stream.update.call_args[0][0])
+        all_lines = await self.manager.all_lines()
+        self.assertEqual(len(new_colors), 4 * len(all_lines))
+        for i, line in enumerate(all_lines):
+            line_rgba = new_colors[4 * i:4 * i + 4]
+            expected_rgb = list(interactions_data[line.kind.name]['color'])
+            expected_alpha = 255 if interactions_data[line.kind.name]['visible'] else 0
+            self.assertEqual(line_rgba, expected_rgb + [expected_alpha])
+            self.assertEqual(list(line.color.rgba), line_rgba)
+
+    async def test_update_interaction_lines_shared_colors(self):
+        """Ensure changing visibility of one line doesn't affect lines sharing its Color."""
+        line_3 = InteractionShapesLine(self.struct2, self.struct3, kind=enums.InteractionKind.Covalent)
+        self.manager.add_lines([self.interaction_line, line_3])
+        stream = MagicMock()
+        plugin = MagicMock()
+        create_stream_fut = asyncio.Future()
+        create_stream_fut.set_result((stream, None))
+        plugin.create_writing_stream.return_value = create_stream_fut
+        await self.manager.update_interaction_lines(default_line_settings, complexes=[self.complex], plugin=plugin)
+        self.assertIs(self.interaction_line.color, line_3.color)
+
+        self.interaction_line.visible = False
+        self.assertFalse(self.interaction_line.visible)
+        self.assertTrue(line_3.visible)
 
 
 class InteractionLineManagerTestCase(unittest.IsolatedAsyncioTestCase):
@@ -199,3 +290,32 @@ class InteractionLineManagerTestCase(unittest.IsolatedAsyncioTestCase):
         structpair_lines_2_3 = self.manager.get_lines_for_structure_pair(
             self.struct2, self.struct3, existing_lines=lines)
         self.assertEqual(len(structpair_lines_2_3), 0)
+
+    @patch('nanome.api.interactions.interaction.Interaction.destroy_multiple')
+    @patch('nanome.api.interactions.interaction.Interaction.upload_multiple')
+    @patch('nanome.api.interactions.interaction.Interaction.get')
+    async def test_update_interaction_lines_unchanged_settings(self, get_mock, upload_mock, destroy_mock):
+        """Ensure lines aren't fetched again when visibility settings haven't changed."""
+        get_mock.return_value = self.get_fut_2_lines
+        interactions_data = {
+            kind: dict(settings) for kind, settings in default_line_settings.items()
+        }
+        await self.manager.update_interaction_lines(interactions_data)
+        await self.manager.update_interaction_lines(interactions_data)
+        self.assertEqual(get_mock.call_count, 1)
+
+        # Changing a setting triggers a new update.
+        interactions_data['Covalent']['visible'] = False
+        await self.manager.update_interaction_lines(interactions_data)
+        self.assertEqual(get_mock.call_count, 2)
+        self.assertFalse(self.interaction_line.visible)
+
+        # Uploading or destroying lines means the next update has to run again.
+        await self.manager.update_interaction_lines(interactions_data)
+        self.assertEqual(get_mock.call_count, 2)
+        self.manager.upload([])
+        await self.manager.update_interaction_lines(interactions_data)
+        self.assertEqual(get_mock.call_count, 3)
+        self.manager.destroy_lines([])
+        await self.manager.update_interaction_lines(interactions_data)
+        self.assertEqual(get_mock.call_count, 4)
@@ -0,0 +1,93 @@
+import itertools
+import os
+import unittest
+from random import randint
+
+from nanome.api.structure import Complex
+from nanome.util import Vector3, enums
+from plugin import utils
+from plugin.models import InteractionShapesLine, InteractionStructure
+
+
+fixtures_dir = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+class GetNeighboringAtomsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        tyl_pdb = f'{fixtures_dir}/1tyl.pdb'
+        self.complex = Complex.io.from_pdb(path=tyl_pdb)
+        self.ligand_atoms = [atom for atom in self.complex.atoms if atom.residue.name == 'TYL']
+
+    def test_get_neighboring_atoms(self):
+        site_size = 6
+        neighbor_atoms = utils.get_neighboring_atoms(self.complex, self.ligand_atoms, site_size=site_size)
+        # Brute force all non-H chain atoms within site_size of a ligand atom.
+        expected_atoms = [
+            atom for atom in self.complex.atoms
+            if not atom.chain.name.startswith('H') and any(
+                Vector3.distance(atom.position, lig_atom.position) <= site_size
+                for lig_atom in self.ligand_atoms)
+        ]
+        self.assertEqual(len(neighbor_atoms), 58)
+        self.assertEqual(
+            sorted(atom.serial for atom in neighbor_atoms),
+            sorted(atom.serial for atom in expected_atoms))
+        # Atoms in ligand chain are never included.
+        self.assertFalse(set(neighbor_atoms) & set(self.ligand_atoms))
+
+    def test_get_neighboring_atoms_no_selection(self):
+        self.assertEqual(utils.get_neighboring_atoms(self.complex, []), [])
+        # Complex without any molecules has no target atoms.
+        self.assertEqual(utils.get_neighboring_atoms(Complex(), self.ligand_atoms), [])
+
+
+class LinesInFrameMaskTestCase(unittest.TestCase):
+
+    def setUp(self):
+        tyl_pdb = f'{fixtures_dir}/1tyl.pdb'
+        self.complex = Complex.io.from_pdb(path=tyl_pdb)
+        for atom in self.complex.atoms:
+            atom.index = randint(1000000000, 4999999999)
+        # Complex that isn't passed to lines_in_frame_mask, so its atoms are never in frame.
+        self.other_complex = Complex.io.from_pdb(path=tyl_pdb)
+        for atom in self.other_complex.atoms:
+            atom.index = randint(5000000000, 9999999999)
+
+        atom_list = list(self.complex.atoms)
+        other_atom_list = list(self.other_complex.atoms)
+        kind = enums.InteractionKind.Covalent
+        single_struct = InteractionStructure(atom_list[0])
+        multi_struct = InteractionStructure(atom_list[2:7])
+        self.in_frame_line = InteractionShapesLine(
+            single_struct, InteractionStructure(atom_list[1]), kind=kind)
+        self.multi_atom_line = InteractionShapesLine(single_struct, multi_struct, kind=kind)
+        self.out_of_frame_line = InteractionShapesLine(
+            single_struct, InteractionStructure(other_atom_list[1]), kind=kind)
+        self.out_of_frame_multi_atom_line = InteractionShapesLine(
+            InteractionStructure(other_atom_list[2:7]), multi_struct, kind=kind)
+        self.wrong_conformer_line = InteractionShapesLine(
+            InteractionStructure(atom_list[8]), InteractionStructure(atom_list[9]), kind=kind)
+        struct_key = InteractionStructure(atom_list[9]).index
+        self.wrong_conformer_line.conformers[struct_key] = 3
+
+    def test_lines_in_frame_mask(self):
+        lines = [
+            self.in_frame_line,
+            self.multi_atom_line,
+            self.out_of_frame_line,
+            self.out_of_frame_multi_atom_line,
+            self.wrong_conformer_line,
+        ]
+        mask = utils.lines_in_frame_mask(lines, [self.complex])
+        self.assertEqual(mask.tolist(), [True, True, False, False, False])
+        # Make sure results match line_in_frame
+        for line, line_is_in_frame in zip(lines, mask.tolist()):
+            atom_iter = itertools.chain.from_iterable(
+                cmp.current_molecule.atoms for cmp in [self.complex])
+            self.assertEqual(bool(utils.line_in_frame(line, atom_iter)), line_is_in_frame)
+
+    def test_lines_in_frame_mask_empty(self):
+        lines = [self.in_frame_line, self.multi_atom_line]
+        self.assertEqual(utils.lines_in_frame_mask(lines, []).tolist(), [False, False])
+        self.assertEqual(len(utils.lines_in_frame_mask([], [self.complex])), 0)